@@ -0,0 +1,210 @@
+"""
+Offline batch analysis: runs the security agent over a JSONL file of queries or incidents.
+
+usage (from backend/):
+    python -m app.batch --input alerts.jsonl --output results.jsonl --concurrency 4 --user-id security_admin
+
+input lines:  {"id": "a-1", "query": "show failed logins today"}
+              {"id": "a-2", "incident": {...}}   (incidents are sent to the agent as JSON text)
+output lines: {"id", "query", "status", "response", "latency_ms"}
+
+The output file is the checkpoint. Re-running with --resume skips the ids already done
+(status ok or rejected) and retries the failed ones.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from .coalesce import AsyncSingleFlight, normalize_key, shared_results
+from .security import CURRENT_USER, get_access_key, is_injection_attempt, log_audit_event, get_audit_log_store
+from .serialization import encode_json
+
+import logging
+logger = logging.getLogger('app.batch')
+
+# identical items in a batch run the agent once
+_batch_flight = AsyncSingleFlight("batch")
+
+# item status -> summary counter
+_STATUS_COUNTERS = {"ok": "Succeeded", "failed": "Failed", "rejected": "Rejected"}
+# statuses a resumed run does not redo
+_DONE_STATUSES = {"ok", "rejected"}
+
+
+def read_items(path: str) -> List[Dict[str, Any]]:
+    """Reads the input JSONL. Items without an id get their line number."""
+    items = []
+    with open(path, mode='r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            query = item.get("query")
+            if query is None and "incident" in item:
+                incident = item["incident"]
+                query = incident if isinstance(incident, str) else json.dumps(incident)
+            if not query:
+                raise ValueError(f"{path}:{line_no}: item has no 'query' or 'incident'")
+            if not isinstance(query, str):
+                raise ValueError(f"{path}:{line_no}: 'query' must be a string")
+            items.append({"id": str(item.get("id", line_no)), "query": query})
+    return items
+
+
+def _read_checkpoint(path: str) -> Dict[str, Dict[str, Any]]:
+    """Returns id -> result from the output file. The last line per id wins."""
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, mode='r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+                results[str(result["id"])] = result
+            except (ValueError, KeyError, TypeError):
+                # partially written last line of an interrupted run
+                continue
+    return results
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """
+    Returns the ids that are done. Failed items are not done,
+    so a resumed run retries them (e.g. after an Ollama timeout).
+    """
+    return {item_id for item_id, result in _read_checkpoint(path).items()
+            if result.get("status") in _DONE_STATUSES}
+
+
+def _compact_checkpoint(path: str) -> None:
+    """
+    Rewrites the output file with one line per done item.
+    Failed lines (about to be retried) and a partially written last line are dropped.
+    """
+    if not os.path.exists(path):
+        return
+    done = [r for r in _read_checkpoint(path).values() if r.get("status") in _DONE_STATUSES]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        for result in done:
+            f.write(json.dumps(result) + "\n")
+    os.replace(tmp_path, path)
+
+
+async def _run_item(agent_executor, item: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    query = item["query"]
+    result = {"id": item["id"], "query": query}
+
+    if is_injection_attempt(query):
+        result.update(status="rejected", response="Rejected due to PI keywords.")
+    else:
+        try:
+            key = (normalize_key(query), get_access_key(user_id))
+            response, _ = await _batch_flight.do(key, lambda: agent_executor.ainvoke({
+                "input": query,
+                "user_id": user_id,
+            }))
+            result.update(status="ok", response=response.get("output", ""))
+        except Exception as e:
+            logger.error(f"Batch item {item['id']} failed: {e}")
+            result.update(status="failed", response=f"Execution failed: {e}")
+
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+async def run_batch(agent_executor, items: List[Dict[str, Any]], output_path: str,
+                    concurrency: int = 4, user_id: str = "batch", resume: bool = False,
+                    input_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Runs the items through the agent with at most `concurrency` in flight.
+    Results are appended to output_path as they finish.
+    The whole run is audited as one batch (BatchStarted / BatchCompleted).
+    """
+    done = set()
+    if resume:
+        done = load_checkpoint(output_path)
+        _compact_checkpoint(output_path)
+    pending = [item for item in items if item["id"] not in done]
+    batch_id = str(uuid.uuid4())
+    summary = {"BatchId": batch_id, "Items": len(items), "Skipped": len(items) - len(pending),
+               "Succeeded": 0, "Failed": 0, "Rejected": 0}
+
+    log_audit_event(user_id, input_name or "batch", "BatchStarted",
+                    {"BatchId": batch_id, "Items": len(items), "Skipped": summary["Skipped"]}, "Received")
+
+    # tools read the user from here
+    CURRENT_USER.set(user_id)
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in pending:
+        queue.put_nowait(item)
+
+    start = time.perf_counter()
+    with open(output_path, mode='a' if resume else 'w', encoding='utf-8') as out, shared_results():
+
+        async def worker():
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = await _run_item(agent_executor, item, user_id)
+                summary[_STATUS_COUNTERS[result["status"]]] += 1
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+
+        await asyncio.gather(*[worker() for _ in range(max(1, concurrency))])
+
+    summary["ElapsedSeconds"] = round(time.perf_counter() - start, 3)
+    status = "Completed" if summary["Failed"] == 0 else "CompletedWithErrors"
+    log_audit_event(user_id, input_name or "batch", "BatchCompleted", summary, status)
+    logger.info(f"Batch {batch_id[:8]} done: {summary}")
+    return summary
+
+
+def write_audit_trail(path: str) -> None:
+    """The audit store is in memory. Append this run's entries to a JSONL file."""
+    with open(path, mode='ab') as f:
+        for entry in get_audit_log_store():
+            f.write(encode_json(entry) + b"\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the security agent over a JSONL file of queries.")
+    parser.add_argument("--input", required=True, help="input JSONL with 'query' or 'incident' per line")
+    parser.add_argument("--output", required=True, help="output JSONL, also used as the checkpoint")
+    parser.add_argument("--concurrency", type=int, default=4, help="max agent calls in flight")
+    # no default: an unknown user falls to the default role, which only sees its own log rows
+    parser.add_argument("--user-id", required=True, help="user the batch runs as (RBAC), e.g. security_admin")
+    parser.add_argument("--resume", action="store_true", help="skip items already done in the output, retry failed ones")
+    parser.add_argument("--audit-output", default=None, help="audit JSONL (default: <output>.audit.jsonl)")
+    args = parser.parse_args(argv)
+
+    from .logger_config import setup_logging
+    from .tools import get_knowledge_base
+    from .agent import create_security_agent
+
+    load_dotenv()
+    setup_logging()
+
+    items = read_items(args.input)
+    get_knowledge_base()
+    agent_executor = create_security_agent()
+
+    summary = asyncio.run(run_batch(agent_executor, items, args.output,
+                                    concurrency=args.concurrency, user_id=args.user_id,
+                                    resume=args.resume, input_name=os.path.basename(args.input)))
+    write_audit_trail(args.audit_output or args.output + ".audit.jsonl")
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from . import metrics
+
+import logging
+logger = logging.getLogger('app.coalesce')
+
+# request coalescing (single-flight).
+# when the same work is already in flight, later callers wait for it
+# instead of starting their own. the result is fanned out to all of them.
+# nothing is cached once the work finishes; the next caller runs it again,
+# unless shared_results() is active (batch runs).
+
+_FLIGHT_NAMES: List[str] = []
+
+# finished results, kept only inside shared_results(). (flight name, key) -> result
+_memo: Optional[Dict[Hashable, Any]] = None
+_memo_lock = threading.Lock()
+
+
+@contextmanager
+def shared_results():
+    """
+    Keeps finished results of every flight group for the duration of the block,
+    so later identical calls reuse them instead of running again.
+    Used by batch runs, where the same retrievals repeat across many items.
+    """
+    global _memo
+    with _memo_lock:
+        _memo = {}
+    try:
+        yield
+    finally:
+        with _memo_lock:
+            _memo = None
+
+
+def _memo_get(name: str, key: Hashable) -> Tuple[bool, Any]:
+    with _memo_lock:
+        if _memo is None or (name, key) not in _memo:
+            return False, None
+        return True, _memo[(name, key)]
+
+
+def _memo_set(name: str, key: Hashable, result: Any) -> None:
+    with _memo_lock:
+        if _memo is not None:
+            _memo[(name, key)] = result
+
+
+def normalize_key(text: str) -> str:
+    """Normalizes free text so trivially different queries share a key."""
+    return " ".join(str(text).lower().split())
+
+
+def _register(name: str) -> None:
+    if name not in _FLIGHT_NAMES:
+        _FLIGHT_NAMES.append(name)
+
+
+def _record(name: str, shared: bool) -> None:
+    metrics.incr(f"coalesce.{name}.calls")
+    if shared:
+        metrics.incr(f"coalesce.{name}.coalesced")
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Thread based single-flight group.
+    Used for the sync tools and embedding calls, which the agent runs in a thread pool.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        _register(name)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Runs fn once per in-flight key.
+        Returns (result, shared) where shared is True if this caller waited on another's call.
+        Exceptions are raised to every waiter.
+        """
+        hit, result = _memo_get(self.name, key)
+        if hit:
+            _record(self.name, True)
+            return result, True
+
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = _Call()
+                self._calls[key] = call
+
+        _record(self.name, shared)
+        if shared:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            _memo_set(self.name, key, call.result)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """
+    asyncio based single-flight group. Used for the chat endpoint.
+    The work runs in its own task so a disconnecting caller does not cancel it for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        _register(name)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # retrieve the exception so asyncio does not warn when every waiter went away
+        if not task.cancelled() and task.exception() is None:
+            _memo_set(self.name, key, task.result())
+
+    async def do(self, key: Hashable, coro_fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async version of SingleFlight.do."""
+        hit, result = _memo_get(self.name, key)
+        if hit:
+            _record(self.name, True)
+            return result, True
+
+        task = self._calls.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(coro_fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+
+        _record(self.name, shared)
+        return await asyncio.shield(task), shared
+
+
+def get_coalesce_stats() -> Dict[str, Dict[str, float]]:
+    """Returns calls, coalesced calls and the coalescing ratio for every flight group."""
+    stats = {}
+    for name in _FLIGHT_NAMES:
+        calls = metrics.get_counter(f"coalesce.{name}.calls")
+        coalesced = metrics.get_counter(f"coalesce.{name}.coalesced")
+        stats[name] = {
+            "calls": calls,
+            "coalesced": coalesced,
+            "ratio": coalesced / calls if calls else 0.0,
+        }
+    return stats
@@ -2,3 +2,29 @@ import os
 
 POLICY_DOCS_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "policies")
 LOG_FILE_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "logs", "security_logs.csv")
+RBAC_POLICY_PATH = os.getenv("RBAC_POLICY_PATH", os.path.join(os.path.dirname(__file__), "..", "data", "rbac", "policy.json"))
+# how long an authorization decision is cached. policy file changes apply within this window.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "4096"))
+# responses smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+# rolling log aggregates (log_stats). 15 min buckets x 96 = 24h of history.
+LOG_STATS_BUCKET_SECONDS = int(os.getenv("LOG_STATS_BUCKET_SECONDS", "900"))
+LOG_STATS_BUCKETS = int(os.getenv("LOG_STATS_BUCKETS", "96"))
+LOG_STATS_SKETCH_WIDTH = int(os.getenv("LOG_STATS_SKETCH_WIDTH", "512"))
+LOG_STATS_SKETCH_DEPTH = int(os.getenv("LOG_STATS_SKETCH_DEPTH", "4"))
+# distinct failed-login IPs per user: per bucket, a depth x width grid of HyperLogLogs
+# with 2^precision registers each. defaults: 128 x 2 x 128 bytes = 32KB per bucket.
+LOG_STATS_HLL_PRECISION = int(os.getenv("LOG_STATS_HLL_PRECISION", "7"))
+LOG_STATS_DISTINCT_WIDTH = int(os.getenv("LOG_STATS_DISTINCT_WIDTH", "128"))
+LOG_STATS_DISTINCT_DEPTH = int(os.getenv("LOG_STATS_DISTINCT_DEPTH", "2"))
+LOG_STATS_TOPK_CAPACITY = int(os.getenv("LOG_STATS_TOPK_CAPACITY", "32"))
+# how often the server ingests newly appended log rows
+LOG_STATS_REFRESH_SECONDS = float(os.getenv("LOG_STATS_REFRESH_SECONDS", "5"))
+# how long a chat request waits for the agent during startup before failing with 503
+STARTUP_WAIT_SECONDS = float(os.getenv("STARTUP_WAIT_SECONDS", "10"))
+# retry backoff for failed builds of the required subsystems (agent, log stats): doubles up to the max
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "2"))
+STARTUP_RETRY_MAX_SECONDS = float(os.getenv("STARTUP_RETRY_MAX_SECONDS", "60"))
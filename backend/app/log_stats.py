@@ -0,0 +1,390 @@
+import asyncio
+import csv
+import datetime
+import hashlib
+import io
+import math
+import os
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from typing import Any, Dict, List, Optional
+
+from .config import (LOG_FILE_PATH, LOG_STATS_BUCKET_SECONDS, LOG_STATS_BUCKETS, LOG_STATS_SKETCH_WIDTH,
+                     LOG_STATS_SKETCH_DEPTH, LOG_STATS_HLL_PRECISION, LOG_STATS_DISTINCT_WIDTH,
+                     LOG_STATS_DISTINCT_DEPTH, LOG_STATS_TOPK_CAPACITY)
+
+import logging
+logger = logging.getLogger('app.log_stats')
+
+# precomputed log aggregates, updated incrementally as rows are appended to the log file.
+# everything is fixed-memory and windowed: count-min sketches and count-min grids of
+# HyperLogLogs in a ring of time buckets, plus a bounded candidate set for top-k.
+# the server ingests new rows in the background (run_ingest_loop), so queries
+# cost the same no matter how big the log gets.
+
+
+def _hash64(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class CountMinSketch:
+    """Count-min sketch. Estimates never undercount."""
+    __slots__ = ("width", "depth", "table")
+
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+        self.table = array('I', bytes(4 * width * depth))
+
+    def positions(self, key: str) -> List[int]:
+        """Flat table positions of a key, one per row (double hashing)."""
+        h = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest(), 'little')
+        h1, h2 = h & 0xFFFFFFFFFFFFFFFF, (h >> 64) | 1
+        return [d * self.width + (h1 + d * h2) % self.width for d in range(self.depth)]
+
+    def add(self, key: str, count: int = 1, positions: Optional[List[int]] = None) -> None:
+        for pos in positions or self.positions(key):
+            self.table[pos] += count
+
+    def estimate(self, key: str, positions: Optional[List[int]] = None) -> int:
+        return min(self.table[pos] for pos in positions or self.positions(key))
+
+    def clear(self) -> None:
+        self.table = array('I', bytes(4 * self.width * self.depth))
+
+
+def _hll_estimate(registers, m: int) -> int:
+    """HyperLogLog cardinality estimate from m registers."""
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / sum(2.0 ** -r for r in registers)
+    zeros = registers.count(0)
+    if estimate <= 2.5 * m and zeros:
+        # small range correction (linear counting)
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+
+class _Ring(ABC):
+    """Maps event times to slots of a ring of time buckets."""
+
+    def __init__(self, bucket_seconds: int, n_buckets: int):
+        self.bucket_seconds = bucket_seconds
+        self.n_buckets = n_buckets
+        self.epochs = [-1] * n_buckets
+
+    @property
+    def span_seconds(self) -> int:
+        return self.bucket_seconds * self.n_buckets
+
+    def slot_for(self, ts: float) -> Optional[int]:
+        """Returns the slot of ts, or None if ts is older than the ring covers.
+        A slot moving to a new epoch is reported through _clear_slot."""
+        epoch = int(ts // self.bucket_seconds)
+        slot = epoch % self.n_buckets
+        if self.epochs[slot] != epoch:
+            if epoch < self.epochs[slot]:
+                return None
+            self._clear_slot(slot)
+            self.epochs[slot] = epoch
+        return slot
+
+    @abstractmethod
+    def _clear_slot(self, slot: int) -> None:
+        """Empties a slot before it is reused for a new bucket."""
+
+    def slots(self, now: float, window_seconds: int) -> List[int]:
+        """Slots covering the window ending at now. The window must fit in the ring."""
+        if window_seconds <= 0 or window_seconds > self.span_seconds:
+            raise ValueError(f"window must be between 1 and {self.span_seconds} seconds")
+        end = int(now // self.bucket_seconds)
+        n = math.ceil(window_seconds / self.bucket_seconds)
+        return [e % self.n_buckets for e in range(end - n + 1, end + 1) if self.epochs[e % self.n_buckets] == e]
+
+
+class SlidingDistinctCounter(_Ring):
+    """
+    Per-key distinct counts over sliding time windows.
+    Each bucket is a count-min style grid (depth x width) of small HyperLogLogs.
+    A key maps to one cell per row; the window is the register-wise max over
+    its buckets, and the min over rows limits inflation from colliding keys.
+    """
+
+    def __init__(self, bucket_seconds: int, n_buckets: int, width: int, depth: int, precision: int):
+        super().__init__(bucket_seconds, n_buckets)
+        self.width = width
+        self.depth = depth
+        self.p = precision
+        self.m = 1 << precision
+        self._sketch = CountMinSketch(width, depth)  # only used for key -> cell positions
+        self.buckets = [bytearray(width * depth * self.m) for _ in range(n_buckets)]
+
+    def _clear_slot(self, slot: int) -> None:
+        self.buckets[slot] = bytearray(self.width * self.depth * self.m)
+
+    def add(self, key: str, item: str, ts: float) -> None:
+        slot = self.slot_for(ts)
+        if slot is None:
+            return
+        h = _hash64(item)
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        registers = self.buckets[slot]
+        for cell in self._sketch.positions(key):
+            pos = cell * self.m + idx
+            if rank > registers[pos]:
+                registers[pos] = rank
+
+    def estimate(self, key: str, now: float, window_seconds: int) -> int:
+        slots = self.slots(now, window_seconds)
+        if not slots:
+            return 0
+        counts = []
+        for cell in self._sketch.positions(key):
+            start = cell * self.m
+            merged = bytes(self.m)
+            for s in slots:
+                merged = bytes(map(max, merged, self.buckets[s][start:start + self.m]))
+            counts.append(_hll_estimate(merged, self.m))
+        return min(counts)
+
+
+class SlidingWindowCounter(_Ring):
+    """
+    Per-key event counts over sliding time windows.
+    A ring of count-min sketches, one per time bucket. Old buckets are reused.
+    """
+
+    def __init__(self, bucket_seconds: int, n_buckets: int, width: int, depth: int):
+        super().__init__(bucket_seconds, n_buckets)
+        self.buckets = [CountMinSketch(width, depth) for _ in range(n_buckets)]
+        self.totals = [0] * n_buckets
+
+    def _clear_slot(self, slot: int) -> None:
+        self.buckets[slot].clear()
+        self.totals[slot] = 0
+
+    def add(self, key: str, ts: float, count: int = 1) -> None:
+        slot = self.slot_for(ts)
+        if slot is None:
+            return
+        self.buckets[slot].add(key, count)
+        self.totals[slot] += count
+
+    def estimate(self, key: str, now: float, window_seconds: int) -> int:
+        slots = self.slots(now, window_seconds)
+        if not slots:
+            return 0
+        positions = self.buckets[0].positions(key)
+        # sum each sketch row over the window, then take the min row (tighter than summing mins)
+        return min(sum(self.buckets[s].table[pos] for s in slots) for pos in positions)
+
+    def total(self, now: float, window_seconds: int) -> int:
+        return sum(self.totals[s] for s in self.slots(now, window_seconds))
+
+
+class TopK:
+    """Bounded set of heavy-hitter candidates. Ranked with a SlidingWindowCounter at query time."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.candidates: Dict[str, int] = {}
+
+    def offer(self, key: str, estimate: int) -> None:
+        if key in self.candidates or len(self.candidates) < self.capacity:
+            self.candidates[key] = estimate
+            return
+        weakest = min(self.candidates, key=self.candidates.get)
+        if estimate > self.candidates[weakest]:
+            del self.candidates[weakest]
+            self.candidates[key] = estimate
+
+    def top(self, counter: SlidingWindowCounter, now: float, window_seconds: int, k: int):
+        scored = []
+        for key in list(self.candidates):
+            count = counter.estimate(key, now, window_seconds)
+            # keep the stored score fresh so aged-out offenders can be replaced
+            self.candidates[key] = count
+            if count:
+                scored.append((count, key))
+        scored.sort(reverse=True)
+        return scored[:k]
+
+
+def _is_failed_login(row: Dict[str, str]) -> bool:
+    return row.get("action") == "login" and row.get("status") == "failed"
+
+
+def _parse_ts(value: str) -> float:
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class LogStats:
+    """
+    Rolling failed-login aggregates over the security log.
+    refresh() reads only the rows appended since the last call. queries do not refresh;
+    the server calls refresh() from run_ingest_loop.
+    """
+
+    def __init__(self, path: str = LOG_FILE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        args = (LOG_STATS_BUCKET_SECONDS, LOG_STATS_BUCKETS, LOG_STATS_SKETCH_WIDTH, LOG_STATS_SKETCH_DEPTH)
+        self.failed_by_user = SlidingWindowCounter(*args)
+        self.failed_by_ip = SlidingWindowCounter(*args)
+        self.top_users = TopK(LOG_STATS_TOPK_CAPACITY)
+        self.top_ips = TopK(LOG_STATS_TOPK_CAPACITY)
+        # distinct IPs with failed logins, per user
+        self.failed_ips_by_user = SlidingDistinctCounter(LOG_STATS_BUCKET_SECONDS, LOG_STATS_BUCKETS,
+                                                         LOG_STATS_DISTINCT_WIDTH, LOG_STATS_DISTINCT_DEPTH,
+                                                         LOG_STATS_HLL_PRECISION)
+        self.watermark: Optional[float] = None
+        self.rows = 0
+        self._offset = 0
+        self._header: Optional[List[str]] = None
+        self._inode = None
+
+    @property
+    def max_window_seconds(self) -> int:
+        """Longest window the ring can answer."""
+        return self.failed_by_user.span_seconds
+
+    def _check_query(self, window_seconds: int, top: int = 1) -> None:
+        if not 0 < window_seconds <= self.max_window_seconds:
+            raise ValueError(f"window must be between 1 and {self.max_window_seconds} seconds")
+        if top < 1:
+            raise ValueError("top must be at least 1")
+
+    def ingest(self, row: Dict[str, str]) -> None:
+        """Updates the aggregates with one log row."""
+        try:
+            ts = _parse_ts(row["timestamp"])
+        except (KeyError, ValueError):
+            return
+        self.rows += 1
+        self.watermark = ts if self.watermark is None else max(self.watermark, ts)
+        user, ip = row.get("user_id", ""), row.get("ip_address", "")
+
+        if not _is_failed_login(row):
+            return
+        full_window = self.max_window_seconds
+        if user and ip:
+            self.failed_ips_by_user.add(user, ip, ts)
+        if user:
+            self.failed_by_user.add(user, ts)
+            self.top_users.offer(user, self.failed_by_user.estimate(user, self.watermark, full_window))
+        if ip:
+            self.failed_by_ip.add(ip, ts)
+            self.top_ips.offer(ip, self.failed_by_ip.estimate(ip, self.watermark, full_window))
+
+    def refresh(self) -> int:
+        """Ingests rows appended to the log file since the last refresh. Returns the number of new rows."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                return 0
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                # new or truncated file: start over
+                self._reset()
+                self._inode = st.st_ino
+            if st.st_size == self._offset:
+                return 0
+
+            with open(self.path, mode='rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+            # only complete lines. a half-written row is picked up next time.
+            end = data.rfind(b"\n") + 1
+            if end == 0:
+                return 0
+
+            # bad bytes or rows are skipped, never retried forever or left behind
+            rows = []
+            reader = csv.reader(io.StringIO(data[:end].decode('utf-8', errors='replace')))
+            while True:
+                try:
+                    values = next(reader)
+                except StopIteration:
+                    break
+                except csv.Error as e:
+                    logger.warning("Log stats: skipping malformed row (%s).", e)
+                    continue
+                if values:
+                    rows.append(values)
+            if self._header is None and rows:
+                self._header = rows.pop(0)
+
+            before = self.rows
+            for values in rows:
+                self.ingest(dict(zip(self._header, values)))
+            # only now is the chunk consumed
+            self._offset += end
+            return self.rows - before
+
+    def snapshot(self, window_seconds: int = 86400, top: int = 5) -> Dict[str, Any]:
+        """
+        Failed-login aggregates for the window ending at the newest log row.
+        Raises ValueError if the window does not fit the ring or top < 1.
+        """
+        self._check_query(window_seconds, top)
+        with self._lock:
+            if self.watermark is None:
+                return {"window_seconds": window_seconds, "as_of": None, "failed_logins": 0,
+                        "top_users": [], "top_ips": []}
+
+            now = self.watermark
+            top_users = [
+                {"user_id": user, "failed_logins": count,
+                 "distinct_ips": self.failed_ips_by_user.estimate(user, now, window_seconds)}
+                for count, user in self.top_users.top(self.failed_by_user, now, window_seconds, top)
+            ]
+            top_ips = [{"ip_address": ip, "failed_logins": count}
+                       for count, ip in self.top_ips.top(self.failed_by_ip, now, window_seconds, top)]
+
+            return {
+                "window_seconds": window_seconds,
+                "as_of": datetime.datetime.fromtimestamp(now, datetime.timezone.utc).isoformat(),
+                "failed_logins": self.failed_by_user.total(now, window_seconds),
+                "top_users": top_users,
+                "top_ips": top_ips,
+            }
+
+    def user_stats(self, user_id: str, window_seconds: int = 86400) -> Dict[str, Any]:
+        """Failed logins and distinct IPs of failed logins of one user."""
+        self._check_query(window_seconds)
+        with self._lock:
+            if self.watermark is None:
+                return {"user_id": user_id, "failed_logins": 0, "distinct_ips": 0}
+            return {"user_id": user_id,
+                    "failed_logins": self.failed_by_user.estimate(user_id, self.watermark, window_seconds),
+                    "distinct_ips": self.failed_ips_by_user.estimate(user_id, self.watermark, window_seconds)}
+
+
+_log_stats = None
+_log_stats_lock = threading.Lock()
+
+def get_log_stats() -> LogStats:
+    """Returns the process wide LogStats, ingesting the log file on first use."""
+    global _log_stats
+    with _log_stats_lock:
+        if _log_stats is None:
+            _log_stats = LogStats()
+            logger.info("Log stats: ingested %d rows.", _log_stats.refresh())
+        return _log_stats
+
+
+async def run_ingest_loop(interval: float) -> None:
+    """Ingests newly appended log rows every interval seconds, until cancelled."""
+    while True:
+        try:
+            new_rows = await asyncio.to_thread(lambda: get_log_stats().refresh())
+            if new_rows:
+                logger.debug("Log stats: ingested %d new rows.", new_rows)
+        except Exception as e:
+            logger.error(f"Error ingesting log stats: {e}")
+        await asyncio.sleep(interval)
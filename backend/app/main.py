@@ -1,4 +1,5 @@
 import os
+import asyncio
 import traceback
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
@@ -7,10 +8,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 # Import our new agent creator and the old tool initializer
-from .tools import get_knowledge_base
+from .tools import get_knowledge_base, get_data_version, set_knowledge_base_listener
 from .agent import create_security_agent
-from .security import AUDIT_LOG_STORE, is_injection_attempt, log_audit_event,  AuditLogEntry
-from typing import List
+from .security import get_audit_log_json, is_injection_attempt, log_audit_event,  AuditLogEntry, CURRENT_USER, get_access_key, is_authorized
+from .log_stats import get_log_stats, run_ingest_loop
+from .serialization import json_response
+from .coalesce import AsyncSingleFlight, normalize_key, get_coalesce_stats
+from .metrics import get_metrics
+from .startup import StartupState, build_in_background
+from .config import STARTUP_WAIT_SECONDS, STARTUP_RETRY_SECONDS, STARTUP_RETRY_MAX_SECONDS, LOG_STATS_REFRESH_SECONDS
+from typing import List, Optional
 
 import logging
 logger = logging.getLogger('app.main')
@@ -32,24 +39,52 @@ class ChatResponse(BaseModel):
     response: str
 
 
+def _chat_response(request: Request, text: str):
+    """Sends a ChatResponse through the compact JSON path."""
+    return json_response(request.headers.get("accept-encoding"), {"response": text}, "chat")
+
+
+# analysts often ask the same thing at the same time during an incident.
+# identical in-flight chats run the agent once and share the answer.
+_chat_flight = AsyncSingleFlight("chat")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # start
+    # staged startup: accept requests now, build the slow parts in the background.
+    # log queries work as soon as the agent is up, policy search once the KB is.
     logger.info("Server starting...")
-    logger.info("Initializing RAG knowledge base...")
-    get_knowledge_base()
-    logger.info("Knowledge base initialized.")
-
-    logger.info("Creating AI agent...")
-    agent_executor = create_security_agent()
-
-    app.state.agent_executor = agent_executor
-    logger.info("AI agent created and ready.")
+    startup = StartupState(["log_stats", "knowledge_base", "agent"], required=["log_stats", "agent"])
+    app.state.startup = startup
+    app.state.agent_executor = None
+
+    def set_agent(agent_executor):
+        app.state.agent_executor = agent_executor
+
+    # the KB can also come up later, rebuilt on first use after a failed startup build.
+    # builds run in worker threads; StartupState belongs to the event loop.
+    loop = asyncio.get_running_loop()
+    set_knowledge_base_listener(lambda: loop.call_soon_threadsafe(startup.mark_ready, "knowledge_base"))
+
+    # required subsystems are retried until they come up; a failed KB is rebuilt lazily on first use
+    retry = {"retry_seconds": STARTUP_RETRY_SECONDS, "max_retry_seconds": STARTUP_RETRY_MAX_SECONDS}
+    tasks = [
+        asyncio.create_task(build_in_background(startup, "log_stats", get_log_stats, **retry)),
+        asyncio.create_task(build_in_background(startup, "knowledge_base", get_knowledge_base)),
+        asyncio.create_task(build_in_background(startup, "agent", create_security_agent, on_ready=set_agent, **retry)),
+        # keeps the log aggregates current so queries never read the file
+        asyncio.create_task(run_ingest_loop(LOG_STATS_REFRESH_SECONDS)),
+    ]
+    startup.mark_live()
 
     yield
 
     # down
     logger.info("Server shutting down...")
+    set_knowledge_base_listener(None)
+    for task in tasks:
+        task.cancel()
 
 app = FastAPI(
     title="EOS Security Incident Knowledge Assistant",
@@ -80,6 +115,21 @@ app.add_middleware(
 def get_root():
     return {"status": "Server is running..."}
 
+@app.get("/health/live")
+def get_liveness():
+    """Liveness: the process is up and serving."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def get_readiness(request: Request):
+    """
+    Readiness: 200 once the minimum serving set (agent, log stats) is up, 503 before.
+    The body reports the mode (degraded while the KB is missing) and each subsystem.
+    """
+    startup = request.app.state.startup
+    return json_response(request.headers.get("accept-encoding"), startup.report(), "health",
+                         status_code=200 if startup.serving else 503)
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def handle_chat(request: Request, chat_request: ChatRequest):
     """
@@ -93,9 +143,18 @@ async def handle_chat(request: Request, chat_request: ChatRequest):
     # any user try to inject forbiden proompts, reject and log it
     if is_injection_attempt(chat_request.query):
         log_audit_event(user_id, query, "InjectionBlocked", {"System": "Rejected due to PI keywords."}, "Rejected")
-        return ChatResponse(response="Sorry... I am not able to process your request.")
+        return _chat_response(request, "Sorry... I am not able to process your request.")
 
-    log_id = log_audit_event(user_id, "QueryReceived", query, {"System": "Processing started."}, 'Received')
+    # during warm-up, wait a bit for the agent, then fail fast with the startup status
+    startup = request.app.state.startup
+    if not await startup.wait_for("agent", STARTUP_WAIT_SECONDS):
+        log_audit_event(user_id, query, "QueryUnavailable", {"System": f"Agent not ready ({startup.mode()})."}, "Rejected")
+        return json_response(request.headers.get("accept-encoding"), {
+            "response": "The assistant is still starting up. Please try again in a moment.",
+            "startup": startup.report(),
+        }, "chat", status_code=503)
+
+    log_id = log_audit_event(user_id, query, "QueryReceived", {"System": "Processing started."}, 'Received')
 
     agent_executor = request.app.state.agent_executor
     try:
@@ -103,15 +162,21 @@ async def handle_chat(request: Request, chat_request: ChatRequest):
         # invoke the agent with the user's input.
         # The agent will decide which tools to call, run them,
         # and generate a final response.
-        response = await agent_executor.ainvoke({
+        # coalesced: if the same query is already running, wait for its answer.
+        # only users with the same access level share answers.
+        # the tools read the user from CURRENT_USER (copied into the agent task).
+        CURRENT_USER.set(user_id)
+        key = (normalize_key(query), get_access_key(user_id), get_data_version())
+        response, shared = await _chat_flight.do(key, lambda: agent_executor.ainvoke({
             "input": chat_request.query,
             "user_id": user_id
             # "chat_history": [] # We can add chat history here later
-        })
+        }))
 
         ai_response = response.get("output", "Sorry, I encountered an error.")
-        log_audit_event(user_id, query, "QueryCompleted", {"Agent": ai_response}, log_id)
-        return ChatResponse(response=ai_response)
+        # every waiter gets its own audit entry, even when the answer was shared
+        log_audit_event(user_id, query, "QueryCompleted", {"Agent": ai_response, "Coalesced": shared}, log_id)
+        return _chat_response(request, ai_response)
 
     except Exception as e:
         # log the full, detailed error on the server side for debugging
@@ -121,15 +186,44 @@ async def handle_chat(request: Request, chat_request: ChatRequest):
         # traceback.print_exc()
         #######################
 
-        log_audit_event(user_id, "QueryFailed", query, "Agent", f"Execution failed: {e}", log_id)
+        log_audit_event(user_id, query, "QueryFailed", {"Agent": f"Execution failed: {e}"}, log_id)
         # a generic, user-friendly message for the frontend
         user_friendly_error = "Sorry, I encountered an issue processing your request. Please try rephrasing or asking something else."
-        return ChatResponse(response=user_friendly_error)
+        return _chat_response(request, user_friendly_error)
 
 @app.get("/api/audit-logs", response_model=List[AuditLogEntry])
-def get_audit_logs():
+def get_audit_logs(request: Request):
     """Returns the list of in-memory audit logs for review."""
-    return AUDIT_LOG_STORE
+    # entries are already encoded. response_model only documents the schema.
+    # passed uncalled so copying and joining the entries is timed as serialization
+    return json_response(request.headers.get("accept-encoding"), get_audit_log_json, "audit_logs")
+
+@app.get("/api/log-stats")
+def get_log_stats_endpoint(request: Request, user_id: str = "anonymous", window_hours: int = 24, top: int = 5,
+                           target_user_id: Optional[str] = None):
+    """
+    Returns precomputed failed-login aggregates (top users/IPs, distinct IPs per user).
+    With target_user_id, also the failed logins and distinct IPs of that user.
+    """
+    accept_encoding = request.headers.get("accept-encoding")
+    if not is_authorized(user_id, "log_access"):
+        log_audit_event(user_id, "log-stats", "LogStatsDenied", {"System": "RBAC denied."}, "Rejected")
+        return json_response(accept_encoding, {"detail": "Access denied."}, "log_stats", status_code=403)
+
+    try:
+        stats = get_log_stats().snapshot(window_seconds=window_hours * 3600, top=top)
+        if target_user_id:
+            stats["user"] = get_log_stats().user_stats(target_user_id, window_seconds=window_hours * 3600)
+    except ValueError as e:
+        return json_response(accept_encoding, {"detail": str(e)}, "log_stats", status_code=400)
+    return json_response(accept_encoding, stats, "log_stats")
+
+@app.get("/api/metrics")
+def get_app_metrics():
+    """Returns in-process metrics, including request coalescing ratios."""
+    snapshot = get_metrics()
+    snapshot["coalescing"] = get_coalesce_stats()
+    return snapshot
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,47 @@
+import threading
+from collections import defaultdict
+from typing import Any, Dict
+
+import logging
+logger = logging.getLogger('app.metrics')
+
+# in-process metrics registry.
+# counters only go up, gauges hold the last value set.
+# FIXME: not shared across workers. move to prometheus if we scale out.
+_lock = threading.Lock()
+_COUNTERS: Dict[str, float] = defaultdict(float)
+_GAUGES: Dict[str, float] = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    """Increments a counter."""
+    with _lock:
+        _COUNTERS[name] += value
+
+
+def set_gauge(name: str, value: float) -> None:
+    """Sets a gauge to the given value."""
+    with _lock:
+        _GAUGES[name] = value
+
+
+def get_counter(name: str) -> float:
+    """Returns the current value of a counter (0 if never incremented)."""
+    with _lock:
+        return _COUNTERS.get(name, 0)
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Returns a snapshot of all counters and gauges."""
+    with _lock:
+        return {
+            "counters": dict(_COUNTERS),
+            "gauges": dict(_GAUGES),
+        }
+
+
+def reset_metrics() -> None:
+    """Clears all metrics. Used by tests."""
+    with _lock:
+        _COUNTERS.clear()
+        _GAUGES.clear()
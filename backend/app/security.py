@@ -1,13 +1,24 @@
 import os
+import json
+import time
 import uuid
 import datetime
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+import msgspec
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, FrozenSet
+
+from . import metrics
+from .serialization import encode_json
+from .config import RBAC_POLICY_PATH, AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES
 
 import logging
 logger = logging.getLogger('app.securyt')
 
-# pydantic model defining the structure of every log entry
+# pydantic model defining the structure of every log entry.
+# used for the API schema only. the store itself holds AuditRecord structs.
 class AuditLogEntry(BaseModel):
     timestamp: str
     audit_id: str
@@ -31,22 +42,53 @@ class AuditLogEntry(BaseModel):
 ##############################
 
 
+# same schema as AuditLogEntry, as a msgspec struct (slots, fast JSON encoding).
+# used on the hot path. validated on construction in log_audit_event.
+class AuditRecord(msgspec.Struct):
+    timestamp: str
+    audit_id: str
+    user_id: str
+    query: str
+    action: str
+    details: Dict[str, Any]
+    status: str
+
+
 # In-memory store for audit logs (SPOF)
-AUDIT_LOG_STORE: List[AuditLogEntry] = []
+AUDIT_LOG_STORE: List[AuditRecord] = []
+# each entry encoded to JSON once, when it is logged.
+# the audit endpoint only joins these, it never re-serializes the store.
+_AUDIT_LOG_ENCODED: List[bytes] = []
+_audit_lock = threading.Lock()
 
 def log_audit_event(user_id: str, query: str, action: str, details: Dict[str, Any], status: str) -> str:
     """Creates a structured audit log entry and stores it."""
     log_id = str(uuid.uuid4())
-    entry = AuditLogEntry(
-        timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(),
-        audit_id=log_id,
-        user_id=user_id,
-        query=query,
-        action=action,
-        details=details,
-        status=status
-    )
-    AUDIT_LOG_STORE.append(entry)
+    # msgspec.convert checks the field types against the schema. the details
+    # values are checked by encoding. either way a bad entry raises
+    # msgspec.ValidationError before anything is stored.
+    entry = msgspec.convert({
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "audit_id": log_id,
+        "user_id": user_id,
+        "query": query,
+        "action": action,
+        "details": details,
+        "status": status,
+    }, AuditRecord)
+
+    # encoding happens here, once per entry, not in the audit endpoint
+    start = time.perf_counter()
+    try:
+        encoded = encode_json(entry)
+    except TypeError as e:
+        raise msgspec.ValidationError(f"Audit details are not JSON serializable: {e}") from e
+    metrics.incr("serialize.audit_entry.count")
+    metrics.incr("serialize.audit_entry.seconds", time.perf_counter() - start)
+
+    with _audit_lock:
+        AUDIT_LOG_STORE.append(entry)
+        _AUDIT_LOG_ENCODED.append(encoded)
     # Print to console for immediate visibility in prototype
     logger.info(f"[AUDIT LOG {status}] ID: {log_id[:8]} | User: {user_id} | Action: {action}")
     return log_id
@@ -55,6 +97,12 @@ def get_audit_log_store():
     """Retrieves the full log store."""
     return AUDIT_LOG_STORE
 
+def get_audit_log_json() -> bytes:
+    """Returns the full log store as a JSON array, built from the pre-encoded entries."""
+    with _audit_lock:
+        encoded = list(_AUDIT_LOG_ENCODED)
+    return b"[" + b",".join(encoded) + b"]"
+
 
 # IPROMPT INJECTION DEFENSE (HEURISTICS)
 # FIMXME: we can do better here
@@ -91,15 +139,184 @@ def is_injection_attempt(query: str) -> bool:
 
     return False
 
-# ROLE-BASED ACCESS CONTROL (RBAC SIMULATION)
-# FIXME: We can do better here...
+# ROLE-BASED ACCESS CONTROL (RBAC)
+# roles, permissions and document ACLs come from a local policy file (RBAC_POLICY_PATH).
+# FIXME: In a production system, user -> role mapping should come from an identity provider.
+
+# user of the request being processed. set by the API so the tools,
+# which the agent calls without a user, can still check access.
+CURRENT_USER: ContextVar[str] = ContextVar("current_user", default="anonymous")
+
+# "*" in a document ACL means every role can read it
+ALL_ROLES = "*"
+
+_policy: Dict[str, Any] = {}
+_policy_mtime: Optional[float] = None
+# bumped every time the effective policy changes
+_policy_version = 0
+# so a missing file is logged once, including on the first load
+_policy_missing = False
+_policy_lock = threading.Lock()
+
+
+def load_rbac_policy() -> Dict[str, Any]:
+    """
+    Loads the RBAC policy file. Reloads it when the file changed on disk.
+    A file that does not parse (e.g. half written) is logged and the last good policy is kept.
+    """
+    global _policy, _policy_mtime, _policy_missing
+    with _policy_lock:
+        try:
+            mtime = os.path.getmtime(RBAC_POLICY_PATH)
+        except OSError:
+            if not _policy_missing:
+                logger.error(f"RBAC policy file not found at {RBAC_POLICY_PATH}. Denying everything.")
+                _policy_missing = True
+            if _policy_mtime is not None or _policy:
+                _bump_policy_version()
+            _policy, _policy_mtime = {}, None
+            return _policy
+        _policy_missing = False
+
+        if mtime != _policy_mtime:
+            # remember the mtime either way, so a broken file is not re-parsed on every call
+            _policy_mtime = mtime
+            try:
+                with open(RBAC_POLICY_PATH, mode='r', encoding='utf-8') as f:
+                    policy = json.load(f)
+                if not isinstance(policy, dict):
+                    raise ValueError("policy must be a JSON object")
+            except (OSError, ValueError) as e:
+                logger.error(f"Error loading RBAC policy {RBAC_POLICY_PATH} ({e}). Keeping the last good policy.")
+                return _policy
+            _policy = policy
+            _bump_policy_version()
+            logger.info("RBAC policy loaded from %s", RBAC_POLICY_PATH)
+        return _policy
+
+
+def _bump_policy_version() -> None:
+    """Called with _policy_lock held. Cached decisions are dropped so revocations apply at once."""
+    global _policy_version
+    _policy_version += 1
+    _auth_cache.clear()
+
+
+def get_policy_version() -> int:
+    """Returns a number that changes whenever the loaded policy changes."""
+    load_rbac_policy()
+    return _policy_version
+
 
-def is_authorized(user_id: str, required_role: str) -> bool:
+class _TTLCache:
+    """Small LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (hit, value)."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_auth_cache = _TTLCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+
+
+def _resolve_roles(user_id: str) -> FrozenSet[str]:
+    policy = load_rbac_policy()
+    roles = policy.get("users", {}).get(user_id)
+    if roles is None:
+        default_role = policy.get("default_role")
+        roles = [default_role] if default_role else []
+    return frozenset(roles)
+
+
+def get_user_roles(user_id: str) -> FrozenSet[str]:
+    """Returns the roles of a user (cached until it expires or the policy changes)."""
+    load_rbac_policy()  # a changed policy file clears the cache
+    key = ("roles", user_id)
+    hit, roles = _auth_cache.get(key)
+    if not hit:
+        roles = _resolve_roles(user_id)
+        _auth_cache.set(key, roles)
+    return roles
+
+
+def is_authorized(user_id: str, permission: str) -> bool:
+    """
+    Checks if any of the user's roles grants the permission.
+    Decisions are cached for AUTH_CACHE_TTL_SECONDS, or until the policy file changes.
     """
-    Simulates checking user roles against required permissions.
-    In a production system, this would query an identity provider.
+    load_rbac_policy()  # a changed policy file clears the cache
+    key = ("perm", user_id, permission)
+    hit, allowed = _auth_cache.get(key)
+    if hit:
+        metrics.incr("auth.cache_hits")
+        return allowed
+
+    metrics.incr("auth.cache_misses")
+    role_permissions = load_rbac_policy().get("roles", {})
+    allowed = any(permission in role_permissions.get(role, []) for role in get_user_roles(user_id))
+    _auth_cache.set(key, allowed)
+    return allowed
+
+
+def get_log_scope(user_id: str) -> Optional[str]:
+    """
+    Returns which log rows a user may read:
+    "all", "own" (rows of their own user_id) or None (no log access).
+    """
+    if is_authorized(user_id, "log_access"):
+        return "all"
+    if is_authorized(user_id, "log_access_own"):
+        return "own"
+    return None
+
+
+def get_access_key(user_id: str) -> tuple:
     """
-    if required_role == "log_access":
-        return user_id == "security_admin"
+    Returns a hashable key that is equal for users who see exactly the same data.
+    Used so coalesced requests never share results across access levels.
+    """
+    scope = get_log_scope(user_id)
+    return (get_user_roles(user_id), scope, user_id if scope == "own" else None)
+
+
+def get_document_roles(source: str) -> List[str]:
+    """Returns the roles allowed to read a policy document (by file name)."""
+    policy = load_rbac_policy()
+    name = os.path.basename(source)
+    return list(policy.get("documents", {}).get(name, policy.get("default_document_roles", [])))
+
+
+def can_read_document(roles: FrozenSet[str], allowed_roles: List[str]) -> bool:
+    """Checks a role set against a document ACL."""
+    return ALL_ROLES in allowed_roles or not roles.isdisjoint(allowed_roles)
+
 
-    return True
+def clear_auth_cache() -> None:
+    """Drops all cached authorization decisions."""
+    _auth_cache.clear()
@@ -0,0 +1,103 @@
+import gzip
+import time
+from typing import Any, Optional
+
+import msgspec
+from starlette.responses import Response
+
+from . import metrics
+from .config import COMPRESSION_MIN_BYTES, GZIP_LEVEL, ZSTD_LEVEL
+
+# zstd is optional. without it we only negotiate gzip.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import logging
+logger = logging.getLogger('app.serialization')
+
+# compact JSON response path (msgspec) with negotiated compression.
+# replaces pydantic model construction + stdlib json on the hot endpoints.
+
+_encoder = msgspec.json.Encoder()
+
+
+def encode_json(obj: Any) -> bytes:
+    """Encodes structs, dicts and lists to compact JSON bytes."""
+    return _encoder.encode(obj)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Picks the content encoding from an Accept-Encoding header.
+    Takes the supported coding with the highest q (zstd wins ties, if installed).
+    q=0 is a refusal, and "*" never overrides a coding that is listed explicitly.
+    Returns None for identity.
+    """
+    if not accept_encoding:
+        return None
+
+    q_values = {}
+    for part in accept_encoding.split(","):
+        name, *params = [p.strip() for p in part.split(";")]
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        q_values[name.lower()] = q
+
+    supported = ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+    wildcard_q = q_values.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in supported:
+        q = q_values.get(coding, wildcard_q)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    """Compresses the body with the given content encoding."""
+    if encoding == "zstd":
+        # compressor objects are not thread safe, make one per call
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+def json_response(accept_encoding: Optional[str], content: Any, name: str,
+                  status_code: int = 200) -> Response:
+    """
+    Builds a JSON response, compressed if the client accepts it and the
+    body is at least COMPRESSION_MIN_BYTES.
+    content can be an object to encode, already encoded JSON bytes, or a
+    callable that returns encoded JSON bytes (timed as serialization).
+    Records serialize time (not for plain bytes) and bytes out under the given name.
+    """
+    if isinstance(content, bytes):
+        body = content
+    else:
+        start = time.perf_counter()
+        body = content() if callable(content) else encode_json(content)
+        metrics.incr(f"serialize.{name}.count")
+        metrics.incr(f"serialize.{name}.seconds", time.perf_counter() - start)
+
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = choose_encoding(accept_encoding) if len(body) >= COMPRESSION_MIN_BYTES else None
+    metrics.incr(f"http.{name}.bytes_raw", len(body))
+    if encoding is not None:
+        start = time.perf_counter()
+        body = compress(body, encoding)
+        metrics.incr(f"compress.{name}.seconds", time.perf_counter() - start)
+        headers["Content-Encoding"] = encoding
+    metrics.incr(f"http.{name}.bytes_out", len(body))
+
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
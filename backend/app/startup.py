@@ -0,0 +1,130 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from . import metrics
+
+import logging
+logger = logging.getLogger('app.startup')
+
+# staged (warm-standby) startup.
+# the server starts accepting requests right away while the slow subsystems
+# (knowledge base, agent, ...) are built in the background.
+# readiness reports which subsystems are up so requests can degrade or fail fast.
+
+# close enough to process start; includes import time
+_PROCESS_START = time.monotonic()
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+
+class StartupState:
+    """Tracks the startup status of each subsystem."""
+
+    def __init__(self, subsystems: List[str], required: Optional[List[str]] = None):
+        self.subsystems: Dict[str, Dict[str, Any]] = {name: {"status": PENDING} for name in subsystems}
+        # the minimum serving set. the others only degrade some answers while missing.
+        self.required = list(subsystems if required is None else required)
+        self._events = {name: asyncio.Event() for name in subsystems}
+        self.live = False
+        self.healthy = False
+        self.fully_ready = False
+
+    def mark_live(self) -> None:
+        """Called once the server can take requests."""
+        if self.live:
+            return
+        self.live = True
+        elapsed = time.monotonic() - _PROCESS_START
+        logger.info("Server live after %.2fs (subsystems still warming up).", elapsed)
+        self._check_healthy(elapsed)
+
+    def _check_healthy(self, elapsed: float) -> None:
+        """Records the first time the serving set is up (readiness first returns 200)."""
+        if self.healthy or not self.live or not self.serving:
+            return
+        self.healthy = True
+        metrics.set_gauge("startup.time_to_first_healthy_seconds", elapsed)
+        logger.info("Server healthy after %.2fs.", elapsed)
+
+    def mark_ready(self, name: str) -> None:
+        if self.subsystems[name]["status"] == READY:
+            return
+        elapsed = time.monotonic() - _PROCESS_START
+        self.subsystems[name] = {"status": READY, "seconds": round(elapsed, 3)}
+        metrics.set_gauge(f"startup.{name}_seconds", elapsed)
+        self._events[name].set()
+        logger.info("Subsystem '%s' ready after %.2fs.", name, elapsed)
+        self._check_healthy(elapsed)
+
+        if not self.fully_ready and all(s["status"] == READY for s in self.subsystems.values()):
+            self.fully_ready = True
+            metrics.set_gauge("startup.time_to_fully_ready_seconds", elapsed)
+            logger.info("All subsystems ready after %.2fs.", elapsed)
+
+    def mark_failed(self, name: str, error: str) -> None:
+        elapsed = time.monotonic() - _PROCESS_START
+        self.subsystems[name] = {"status": FAILED, "seconds": round(elapsed, 3), "error": error}
+        # wake up waiters so they fail fast instead of timing out
+        self._events[name].set()
+        logger.error("Subsystem '%s' failed after %.2fs: %s", name, elapsed, error)
+
+    def is_ready(self, name: str) -> bool:
+        return self.subsystems[name]["status"] == READY
+
+    async def wait_for(self, name: str, timeout: float) -> bool:
+        """Waits up to timeout seconds for a subsystem. Returns True if it is ready."""
+        if self.subsystems[name]["status"] == PENDING and timeout > 0:
+            try:
+                await asyncio.wait_for(self._events[name].wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.is_ready(name)
+
+    @property
+    def serving(self) -> bool:
+        """True once every required subsystem is ready."""
+        return all(self.is_ready(name) for name in self.required)
+
+    def mode(self) -> str:
+        """starting (nothing usable yet), degraded (some subsystems up) or ready."""
+        if self.fully_ready:
+            return "ready"
+        if any(s["status"] == READY for s in self.subsystems.values()):
+            return "degraded"
+        return "starting"
+
+    def report(self) -> Dict[str, Any]:
+        return {"live": self.live, "serving": self.serving, "mode": self.mode(), "subsystems": dict(self.subsystems)}
+
+
+async def build_in_background(state: StartupState, name: str, fn: Callable[[], Any],
+                              on_ready: Optional[Callable[[Any], None]] = None,
+                              retry_seconds: Optional[float] = None, max_retry_seconds: float = 60) -> None:
+    """
+    Runs a blocking builder in a worker thread and records the outcome.
+    A builder returning None counts as failed (that is how get_knowledge_base reports errors).
+    With retry_seconds, a failed build is retried with doubling backoff (capped at max_retry_seconds)
+    until it succeeds, so a required subsystem does not stay failed for the life of the process.
+    """
+    delay = retry_seconds
+    while True:
+        try:
+            result = await asyncio.to_thread(fn)
+            error = None if result is not None else "builder returned no result"
+        except Exception as e:
+            error = str(e)
+        if error is None:
+            break
+        state.mark_failed(name, error)
+        if retry_seconds is None:
+            return
+        logger.info("Retrying subsystem '%s' in %.1fs.", name, delay)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_retry_seconds)
+
+    if on_ready is not None:
+        on_ready(result)
+    state.mark_ready(name)
@@ -1,8 +1,12 @@
 import csv
 import os
+import threading
 
+import faiss
+import numpy as np
 from langchain_community.document_loaders import DirectoryLoader, UnstructuredMarkdownLoader
 from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
 from langchain_ollama import OllamaEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.tools import tool, InjectedToolArg
@@ -10,7 +14,10 @@ from typing_extensions import Annotated
 
 
 from .config import POLICY_DOCS_PATH, LOG_FILE_PATH
-# from .security import is_authorized
+from .coalesce import SingleFlight, normalize_key
+from .log_stats import get_log_stats
+from .security import (CURRENT_USER, is_authorized, get_log_scope, get_access_key,
+                       get_user_roles, get_document_roles, can_read_document, get_policy_version)
 
 import logging
 logger = logging.getLogger('app.tools')
@@ -19,16 +26,90 @@ logger = logging.getLogger('app.tools')
 # in-memory vector store
 # FIXME: this could be a bottle neck in the furuture if is grows.
 _vector_store = None
+# bumped every time the KB is (re)built. part of the data version stamp.
+_kb_generation = 0
+# one KB build at a time. startup builds it in the background.
+_kb_lock = threading.Lock()
+# called (from the building thread) after every successful KB build
+_kb_ready_listener = None
+
+# single-flight groups. identical concurrent calls run once.
+_embedding_flight = SingleFlight("embedding")
+_policy_search_flight = SingleFlight("security_policy_search")
+_log_query_flight = SingleFlight("query_security_logs")
+
+# faiss ids readable by a role set, per KB and policy version.
+# (db id, kb_generation, policy_version, roles) -> (ids array, IDSelectorBatch).
+# the array must outlive the selector.
+_role_selectors = {}
+_role_selectors_lock = threading.Lock()
+
+
+class CoalescedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model so identical concurrent embed_query calls
+    hit the Ollama backend only once.
+    """
+
+    def __init__(self, embeddings: Embeddings):
+        self._embeddings = embeddings
+
+    def embed_documents(self, texts):
+        return self._embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        result, _ = _embedding_flight.do(text, lambda: self._embeddings.embed_query(text))
+        return result
+
+
+def get_data_version():
+    """
+    Returns a stamp that changes whenever the data behind the tools changes
+    (KB rebuilt, log file written). Used in the coalescing keys.
+    """
+    try:
+        st = os.stat(LOG_FILE_PATH)
+        log_version = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        log_version = None
+    return (_kb_generation, log_version)
+
 
 def get_knowledge_base():
     """
     Initializes and returns the RAG knowledge base (vector store).
     Loads policy documents, splits them, embeds them, and stores them in FAISS.
     """
-    global _vector_store
     if _vector_store is not None:
         return _vector_store
 
+    with _kb_lock:
+        if _vector_store is not None:
+            return _vector_store
+        db = _build_knowledge_base()
+    # also covers the lazy rebuild on first use after a failed startup build
+    if db is not None and _kb_ready_listener is not None:
+        _kb_ready_listener()
+    return db
+
+
+def set_knowledge_base_listener(listener) -> None:
+    """Registers a callable run after the KB is built. None removes it."""
+    global _kb_ready_listener
+    _kb_ready_listener = listener
+
+
+def is_knowledge_base_ready() -> bool:
+    return _vector_store is not None
+
+
+def is_knowledge_base_building() -> bool:
+    return _vector_store is None and _kb_lock.locked()
+
+
+def _build_knowledge_base():
+    global _vector_store, _kb_generation
+
     ollama_base_url = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434') # fallback for local dev
     embedding_model = "nomic-embed-text"
 
@@ -49,9 +130,15 @@ def get_knowledge_base():
         text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
         splits = text_splitter.split_documents(docs)
 
+        # ACL metadata is stored in the docstore next to each vector
+        for split in splits:
+            split.metadata["allowed_roles"] = get_document_roles(split.metadata.get("source", ""))
+            split.metadata["acl_version"] = get_policy_version()
+
         embeddings =OllamaEmbeddings(model=embedding_model,
                                      base_url=ollama_base_url)
-        _vector_store = FAISS.from_documents(splits, embeddings)
+        _vector_store = FAISS.from_documents(splits, CoalescedEmbeddings(embeddings))
+        _kb_generation += 1
         logger.info("KB init complete.")
         return _vector_store
 
@@ -59,20 +146,93 @@ def get_knowledge_base():
         logger.error("Error KB init failed: %s", e)
         return None
 
+def _refresh_document_acls(db, policy_version: int) -> None:
+    """Re-resolves the ACL metadata of the KB documents after the RBAC policy changed."""
+    for doc_id in db.index_to_docstore_id.values():
+        metadata = db.docstore.search(doc_id).metadata
+        if "source" in metadata and metadata.get("acl_version") != policy_version:
+            metadata["allowed_roles"] = get_document_roles(metadata["source"])
+            metadata["acl_version"] = policy_version
+
+
+def _get_role_selector(db, roles):
+    """
+    Returns (ids, selector) for the vectors the roles may read.
+    ids is None when every vector is readable (no filtering needed).
+    """
+    policy_version = get_policy_version()
+    cache_key = (id(db), _kb_generation, policy_version, roles)
+    with _role_selectors_lock:
+        cached = _role_selectors.get(cache_key)
+    if cached is not None:
+        return cached
+
+    _refresh_document_acls(db, policy_version)
+    ids = [
+        faiss_id for faiss_id, doc_id in db.index_to_docstore_id.items()
+        if can_read_document(roles, db.docstore.search(doc_id).metadata.get("allowed_roles", []))
+    ]
+    if len(ids) == db.index.ntotal:
+        cached = (None, None)
+    else:
+        id_array = np.array(ids, dtype=np.int64)
+        cached = (id_array, faiss.IDSelectorBatch(len(id_array), faiss.swig_ptr(id_array)))
+
+    with _role_selectors_lock:
+        # drop selectors built under an older policy
+        for key in [k for k in _role_selectors if k[2] != policy_version]:
+            del _role_selectors[key]
+        _role_selectors[cache_key] = cached
+    return cached
+
+
+def filtered_similarity_search(db, query: str, roles, k: int = 2):
+    """
+    Similarity search restricted to the documents the roles may read.
+    The ACL filter runs inside the FAISS scan (IDSelector), so the top-k
+    slots are never wasted on documents that would be dropped afterwards.
+    """
+    ids, selector = _get_role_selector(db, roles)
+    if ids is None:
+        return db.similarity_search(query, k=k)
+    if len(ids) == 0:
+        return []
+
+    vector = np.array([db._embed_query(query)], dtype=np.float32)
+    if db._normalize_L2:
+        faiss.normalize_L2(vector)
+    _, indices = db.index.search(vector, k, params=faiss.SearchParameters(sel=selector))
+    return [db.docstore.search(db.index_to_docstore_id[i]) for i in indices[0] if i != -1]
+
+
 @tool
 def security_policy_search(query: str) -> str:
     """
     searches the security policy and playbooks.
     """
 
+    # identity only from the request context, never from tool input
+    user_id = CURRENT_USER.get()
     logger.debug("Tool: security_policy_search query: %s", query)
+    if not is_authorized(user_id, "policy_search"):
+        logger.info(f"RBAC DENY: User {user_id} attempted unauthorized policy search.")
+        return "Access Denied: You do not have the required role to search security policies."
+
+    # degraded mode during startup: don't block the agent on the KB build
+    if is_knowledge_base_building():
+        return "Policy search is still warming up. Please try again in a moment."
+
     db = get_knowledge_base()
     if db is None:
         return "Error: Knowledge base is not initialized."
 
-    # similarity search
+    # similarity search, filtered by the caller's roles
+    # identical concurrent searches share one embedding + FAISS lookup
     try:
-        docs = db.similarity_search(query, k=2) # top 2 relevant chunks
+        roles = get_user_roles(user_id)
+        # the policy version keeps memoized results from outliving an ACL change
+        key = (normalize_key(query), roles, get_data_version(), get_policy_version())
+        docs, _ = _policy_search_flight.do(key, lambda: filtered_similarity_search(db, query, roles, k=2)) # top 2 relevant chunks
         if not docs:
             return "No relevant policy information found."
 
@@ -83,42 +243,62 @@ def security_policy_search(query: str) -> str:
         return f"Error performing search: {e}"
 
 
-@tool
-# def query_security_logs(log_query: str, user_id: Annotated[str, InjectedToolArg()]) -> str:
-def query_security_logs(log_query: str, user_id="anonymous") -> str:
+def _scan_logs(query_lower: str, own_user_id: str = None):
     """
-    Use this tool to find log entries.
-    Security logs (security_logs.csv) for specific events.
+    Scans the log file and returns the rows matching the query keywords.
+    If own_user_id is set, only that user's rows are considered.
     """
 
-    logger.debug(f"Tool: Running query_security_logs with query: '{log_query}'")
-    print('>>> query log userid', user_id)
-    # if not is_authorized(user_id, "log_access"):
-    #     logger.info(f"RBAC DENY: User {user_id} attempted unauthorized log access.")
-    #     return "Access Denied: You do not have the required role to query security logs. Please contact the security team."
-
     # simulate "today" for the mock data
     # change this datetime today
     today_str = "2024-10-28"
-    query_lower = log_query.lower()
 
     results = []
-    try:
-        with open(LOG_FILE_PATH, mode='r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
+    with open(LOG_FILE_PATH, mode='r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+
+        for row in reader:
+            # access filter first, so denied rows are never matched
+            if own_user_id is not None and row['user_id'] != own_user_id:
+                continue
+
+            row_str = " ".join(row.values()).lower() # combine all fields for easy search
+            match = False
+            # treat today as an important keyword. make sure it handled.
+            if "today" in query_lower and today_str not in row['timestamp']:
+                continue
 
-            for row in reader:
-                row_str = " ".join(row.values()).lower() # combine all fields for easy search
-                match = False
-                # treat today as an important keyword. make sure it handled.
-                if "today" in query_lower and today_str not in row['timestamp']:
-                    continue
+            if any(keyword in row_str for keyword in query_lower.split() if keyword not in ["today", "show", "me"]):
+                match = True
 
-                if any(keyword in row_str for keyword in query_lower.split() if keyword not in ["today", "show", "me"]):
-                    match = True
+            if match:
+                results.append(row)
+
+    return results
+
+
+@tool
+def query_security_logs(log_query: str) -> str:
+    """
+    Use this tool to find log entries.
+    Security logs (security_logs.csv) for specific events.
+    """
 
-                if match:
-                    results.append(row)
+    # identity only from the request context, never from tool input
+    user_id = CURRENT_USER.get()
+    logger.debug(f"Tool: Running query_security_logs with query: '{log_query}' for user '{user_id}'")
+    scope = get_log_scope(user_id)
+    if scope is None:
+        logger.info(f"RBAC DENY: User {user_id} attempted unauthorized log access.")
+        return "Access Denied: You do not have the required role to query security logs. Please contact the security team."
+
+    query_lower = log_query.lower()
+    own_user_id = user_id if scope == "own" else None
+
+    try:
+        # identical concurrent queries share one scan of the log file
+        key = (normalize_key(log_query), get_access_key(user_id), get_data_version())
+        results, _ = _log_query_flight.do(key, lambda: _scan_logs(query_lower, own_user_id))
 
         if not results:
             return f"No log entries found matching '{log_query}'."
@@ -142,9 +322,53 @@ def query_security_logs(log_query: str, user_id="anonymous") -> str:
         logger.error(f"Error querying logs: {e}")
         return f"Error querying logs: {e}"
 
+@tool
+def security_log_stats(question: str, target_user_id: str = None) -> str:
+    """
+    Use this tool for counts and rankings over the security logs:
+    repeated failed logins per user or IP, top offenders, distinct IPs per user.
+    Set target_user_id to get the failed logins and distinct IPs of one user.
+    Answers from precomputed aggregates, so prefer it over query_security_logs for counting.
+    """
+
+    # identity only from the request context, never from tool input
+    user_id = CURRENT_USER.get()
+    logger.debug(f"Tool: Running security_log_stats with question: '{question}' for user '{user_id}'")
+    # aggregates cover every user's rows
+    if not is_authorized(user_id, "log_access"):
+        logger.info(f"RBAC DENY: User {user_id} attempted unauthorized log stats access.")
+        return "Access Denied: You do not have the required role to query security logs. Please contact the security team."
+
+    window_seconds = 3600 if "hour" in question.lower() else 86400
+    try:
+        if target_user_id:
+            stats = get_log_stats().user_stats(target_user_id, window_seconds=window_seconds)
+        else:
+            stats = get_log_stats().snapshot(window_seconds=window_seconds, top=5)
+    except Exception as e:
+        logger.error(f"Error reading log stats: {e}")
+        return f"Error reading log stats: {e}"
+
+    if target_user_id:
+        return (f"{stats['user_id']}: {stats['failed_logins']} failed logins from {stats['distinct_ips']} "
+                f"distinct IPs in the {window_seconds // 3600}h window.")
+
+    if not stats["failed_logins"]:
+        return f"No failed logins in the {window_seconds // 3600}h window ending {stats['as_of']}."
+
+    summary = f"Failed logins in the {window_seconds // 3600}h window ending {stats['as_of']}: {stats['failed_logins']}\n"
+    summary += "Top users:\n"
+    for u in stats["top_users"]:
+        summary += f"- {u['user_id']}: {u['failed_logins']} failed logins from {u['distinct_ips']} distinct IPs\n"
+    summary += "Top IPs:\n"
+    for ip in stats["top_ips"]:
+        summary += f"- {ip['ip_address']}: {ip['failed_logins']} failed logins\n"
+    return summary
+
 def get_all_tools():
     """Returns a list of all defined tools for the agent."""
 
-    get_knowledge_base()
-    return [security_policy_search, query_security_logs]
+    # the KB is built separately (in the background at startup).
+    # security_policy_search reports when it is not ready yet.
+    return [security_policy_search, query_security_logs, security_log_stats]
 
@@ -0,0 +1,70 @@
+"""
+Benchmark: role-filtered policy search vs unfiltered search.
+
+Builds a synthetic FAISS index (fake embeddings, no Ollama needed) where half of
+the chunks are restricted, then times both paths.
+
+usage (from backend/):
+    python -m test.bench_rbac_search --docs 20000 --queries 200
+"""
+import argparse
+import math
+import random
+import statistics
+import time
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.tools import filtered_similarity_search
+
+
+def build_index(n_docs: int, dim: int) -> FAISS:
+    docs = [
+        Document(
+            page_content=f"policy chunk {i}",
+            metadata={"allowed_roles": ["*"] if i % 2 == 0 else ["security_admin"]},
+        )
+        for i in range(n_docs)
+    ]
+    return FAISS.from_documents(docs, DeterministicFakeEmbedding(size=dim))
+
+
+def timed(fn, queries):
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    # nearest-rank p99
+    return statistics.mean(latencies), latencies[math.ceil(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=2)
+    args = parser.parse_args()
+
+    db = build_index(args.docs, args.dim)
+    queries = [f"query {random.randint(0, 10**6)}" for _ in range(args.queries)]
+    employee = frozenset(["employee"])
+
+    # warm up the role selector cache
+    filtered_similarity_search(db, queries[0], employee, k=args.k)
+
+    unfiltered = timed(lambda q: db.similarity_search(q, k=args.k), queries)
+    filtered = timed(lambda q: filtered_similarity_search(db, q, employee, k=args.k), queries)
+
+    print(f"docs={args.docs} dim={args.dim} queries={args.queries} k={args.k}")
+    print(f"unfiltered: mean {unfiltered[0]:.3f} ms  p99 {unfiltered[1]:.3f} ms")
+    print(f"filtered:   mean {filtered[0]:.3f} ms  p99 {filtered[1]:.3f} ms")
+    print(f"overhead:   {filtered[0] / unfiltered[0]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
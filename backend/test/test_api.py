@@ -64,6 +64,7 @@
 
 import pytest
 import os
+from app.security import CURRENT_USER
 from app.tools import security_policy_search, query_security_logs, get_knowledge_base
 
 # Mark all tests in this file as async using pytest-asyncio
@@ -76,6 +77,15 @@ def initialize_kb():
     get_knowledge_base()
 
 
+@pytest.fixture
+def as_user():
+    """Sets the request user the tools read their identity from."""
+    tokens = []
+    yield lambda user_id: tokens.append(CURRENT_USER.set(user_id))
+    for token in reversed(tokens):
+        CURRENT_USER.reset(token)
+
+
 # --- Policy Tool Tests (Using .invoke() and flexible checks) ---
 
 def test_security_policy_search_phishing():
@@ -109,8 +119,9 @@ def test_security_policy_search_no_results():
 
 # --- Log Tool Tests (Using .invoke()) ---
 
-def test_query_security_logs_failed_logins_today():
+def test_query_security_logs_failed_logins_today(as_user):
     """Test querying for failed logins on the mock date."""
+    as_user("security_admin")
     result = query_security_logs.invoke("show failed logins today")
     result_lower = result.lower()
 
@@ -122,8 +133,9 @@ def test_query_security_logs_failed_logins_today():
     assert "invalid password" in result_lower
     assert "2024-10-28" in result
 
-def test_query_security_logs_specific_user():
+def test_query_security_logs_specific_user(as_user):
     """Test querying logs for a specific user."""
+    as_user("security_admin")
     result = query_security_logs.invoke("activity for user alex.m")
     result_lower = result.lower()
 
@@ -132,8 +144,9 @@ def test_query_security_logs_specific_user():
     assert "file_access" in result_lower
     assert "203.0.113.12" in result
 
-def test_query_security_logs_no_results():
+def test_query_security_logs_no_results(as_user):
     """Test querying for logs that don't exist."""
+    as_user("security_admin")
     result = query_security_logs.invoke("show successful logins from 2023")
     result_lower = result.lower()
 
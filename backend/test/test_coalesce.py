@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from app.coalesce import SingleFlight, AsyncSingleFlight, normalize_key, get_coalesce_stats, shared_results
+
+
+def test_normalize_key():
+    """Case and whitespace differences map to the same key."""
+    assert normalize_key("  Show FAILED   logins\ttoday ") == "show failed logins today"
+
+
+def test_single_flight_runs_once_for_concurrent_callers():
+    """Concurrent identical calls run the function once and share the result."""
+    flight = SingleFlight("test_threads")
+    calls = []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(2)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert [r for r, _ in results] == ["result"] * 5
+    assert sum(1 for _, shared in results if shared) == 4
+
+    stats = get_coalesce_stats()["test_threads"]
+    assert stats["calls"] == 5
+    assert stats["coalesced"] == 4
+
+
+def test_single_flight_does_not_cache_finished_calls():
+    """Once a call finishes, the next caller runs the work again."""
+    flight = SingleFlight("test_sequential")
+    counter = []
+
+    def work():
+        counter.append(1)
+        return len(counter)
+
+    assert flight.do("k", work) == (1, False)
+    assert flight.do("k", work) == (2, False)
+
+
+def test_single_flight_propagates_errors():
+    """The leader's exception is raised to the caller."""
+    flight = SingleFlight("test_errors")
+
+    def work():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("k", work)
+    # the failed key is released
+    assert flight.do("k", lambda: "ok") == ("ok", False)
+
+
+def test_async_single_flight_runs_once():
+    """Concurrent identical coroutines run once and fan out the result."""
+    flight = AsyncSingleFlight("test_async")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"output": "answer"}
+
+    async def main():
+        return await asyncio.gather(*[flight.do("k", work) for _ in range(3)])
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [r for r, _ in results] == [{"output": "answer"}] * 3
+    assert [shared for _, shared in results] == [False, True, True]
+
+
+def test_shared_results_reuses_finished_calls():
+    """Inside shared_results(), finished results are reused; outside they are not."""
+    flight = SingleFlight("test_shared")
+    counter = []
+
+    def work():
+        counter.append(1)
+        return len(counter)
+
+    with shared_results():
+        assert flight.do("k", work) == (1, False)
+        assert flight.do("k", work) == (1, True)
+    assert flight.do("k", work) == (2, False)
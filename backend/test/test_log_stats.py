@@ -0,0 +1,108 @@
+import shutil
+
+import pytest
+from app.config import LOG_FILE_PATH
+from app.log_stats import CountMinSketch, SlidingDistinctCounter, SlidingWindowCounter, LogStats
+
+
+def test_count_min_sketch_never_undercounts():
+    cms = CountMinSketch(64, 4)
+    for i in range(500):
+        cms.add(f"key{i % 50}")
+    assert all(cms.estimate(f"key{i}") >= 10 for i in range(50))
+
+
+def test_sliding_distinct_counter():
+    """Distinct counts are per key and per window."""
+    counter = SlidingDistinctCounter(bucket_seconds=60, n_buckets=10, width=16, depth=2, precision=10)
+    for i in range(5000):
+        counter.add("alice", f"10.0.{i // 256}.{i % 256}", ts=0)
+    assert abs(counter.estimate("alice", now=0, window_seconds=60) - 5000) / 5000 < 0.1
+
+    for ip in ["1.1.1.1", "2.2.2.2", "1.1.1.1"]:
+        counter.add("bob", ip, ts=500)
+    counter.add("bob", "3.3.3.3", ts=0)
+    assert counter.estimate("bob", now=500, window_seconds=60) == 2
+    assert counter.estimate("bob", now=500, window_seconds=600) == 3
+    assert counter.estimate("carol", now=500, window_seconds=600) == 0
+
+
+def test_sliding_window_expires_old_buckets():
+    counter = SlidingWindowCounter(bucket_seconds=60, n_buckets=10, width=64, depth=4)
+    counter.add("1.2.3.4", ts=0)
+    counter.add("1.2.3.4", ts=500)
+    assert counter.estimate("1.2.3.4", now=500, window_seconds=600) == 2
+    assert counter.estimate("1.2.3.4", now=500, window_seconds=60) == 1
+    # ring moved past the first bucket
+    counter.add("1.2.3.4", ts=700)
+    assert counter.estimate("1.2.3.4", now=700, window_seconds=600) == 2
+
+
+def test_log_stats_from_log_file(tmp_path):
+    path = tmp_path / "security_logs.csv"
+    shutil.copy(LOG_FILE_PATH, path)
+    stats = LogStats(str(path))
+    stats.refresh()
+
+    snapshot = stats.snapshot(window_seconds=86400, top=5)
+    assert snapshot["failed_logins"] == 3
+    assert snapshot["top_users"][0] == {"user_id": "jane.d", "failed_logins": 2, "distinct_ips": 1}
+    assert snapshot["top_ips"][0] == {"ip_address": "198.51.100.45", "failed_logins": 2}
+    assert {"user_id": "sam.k", "failed_logins": 1, "distinct_ips": 1} in snapshot["top_users"]
+
+
+def test_log_stats_incremental_ingest(tmp_path):
+    path = tmp_path / "security_logs.csv"
+    shutil.copy(LOG_FILE_PATH, path)
+    stats = LogStats(str(path))
+    assert stats.refresh() == 8
+
+    with open(path, "a") as f:
+        f.write("2024-10-28T11:00:00Z,sam.k,login,failed,104.22.15.9,invalid password\n")
+        f.write("2024-10-28T11:00:05Z,sam.k,login,failed,104.22")  # half written row
+    assert stats.refresh() == 1
+
+    assert stats.user_stats("sam.k") == {"user_id": "sam.k", "failed_logins": 2, "distinct_ips": 2}
+
+
+def test_log_stats_distinct_ips_count_failed_logins_only(tmp_path):
+    """Successful logins and rows outside the window do not add distinct IPs."""
+    path = tmp_path / "security_logs.csv"
+    path.write_text(
+        "timestamp,user_id,action,status,ip_address,details\n"
+        "2024-10-27T09:00:00Z,sam.k,login,failed,10.0.0.1,invalid password\n"
+        "2024-10-28T10:00:00Z,sam.k,login,success,10.0.0.2,\n"
+        "2024-10-28T10:30:00Z,sam.k,login,failed,10.0.0.3,invalid password\n"
+    )
+    stats = LogStats(str(path))
+    stats.refresh()
+
+    assert stats.user_stats("sam.k", window_seconds=3600) == {"user_id": "sam.k", "failed_logins": 1,
+                                                              "distinct_ips": 1}
+    assert stats.user_stats("sam.k", window_seconds=stats.max_window_seconds)["distinct_ips"] == 1
+
+
+def test_log_stats_rejects_bad_queries(tmp_path):
+    stats = LogStats(str(tmp_path / "missing.csv"))
+    with pytest.raises(ValueError):
+        stats.snapshot(window_seconds=stats.max_window_seconds + 1)
+    with pytest.raises(ValueError):
+        stats.snapshot(window_seconds=0)
+    with pytest.raises(ValueError):
+        stats.snapshot(top=0)
+    with pytest.raises(ValueError):
+        stats.user_stats("sam.k", window_seconds=-3600)
+
+
+def test_log_stats_skips_undecodable_bytes(tmp_path):
+    """Bad bytes do not fail the refresh or drop the rows around them."""
+    path = tmp_path / "security_logs.csv"
+    path.write_bytes(
+        b"timestamp,user_id,action,status,ip_address,details\n"
+        b"2024-10-28T10:00:00Z,sam.k,login,failed,10.0.0.1,bad \xff bytes\n"
+        b"2024-10-28T10:05:00Z,sam.k,login,failed,10.0.0.2,invalid password\n"
+    )
+    stats = LogStats(str(path))
+    assert stats.refresh() == 2
+    assert stats.refresh() == 0
+    assert stats.user_stats("sam.k") == {"user_id": "sam.k", "failed_logins": 2, "distinct_ips": 2}
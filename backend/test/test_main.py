@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, tools
+from app.main import app
+
+
+def test_log_stats_endpoint_validates_query():
+    """Windows longer than the aggregates cover and non-positive top are rejected."""
+    client = TestClient(app)  # no lifespan: the endpoint does not need the agent
+
+    response = client.get("/api/log-stats", params={"user_id": "security_admin", "window_hours": 168})
+    assert response.status_code == 400
+    assert "window" in response.json()["detail"]
+
+    response = client.get("/api/log-stats", params={"user_id": "security_admin", "top": -1})
+    assert response.status_code == 400
+
+    response = client.get("/api/log-stats", params={"user_id": "security_admin", "window_hours": 24, "top": 1})
+    assert response.status_code == 200
+    assert response.json()["window_seconds"] == 86400
+    assert len(response.json()["top_users"]) == 1
+
+    response = client.get("/api/log-stats", params={"user_id": "security_admin", "target_user_id": "jane.d"})
+    assert response.json()["user"] == {"user_id": "jane.d", "failed_logins": 2, "distinct_ips": 1}
+
+
+class FakeAgent:
+    async def ainvoke(self, inputs):
+        return {"output": f"answer to {inputs['input']}"}
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def stub_startup(monkeypatch):
+    """Replaces the slow builders. Each one blocks until its gate is opened."""
+    gates = {name: threading.Event() for name in ("log_stats", "knowledge_base", "agent")}
+    kb_results = []
+
+    def gated(name, result):
+        def build():
+            gates[name].wait(5)
+            return result() if callable(result) else result
+        return build
+
+    async def idle_ingest(interval):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(main, "STARTUP_WAIT_SECONDS", 0.05)
+    monkeypatch.setattr(main, "run_ingest_loop", idle_ingest)
+    monkeypatch.setattr(main, "get_log_stats", gated("log_stats", "stats"))
+    monkeypatch.setattr(main, "create_security_agent", gated("agent", FakeAgent))
+    # main builds the KB through tools.get_knowledge_base, so the ready listener runs
+    monkeypatch.setattr(tools, "_build_knowledge_base", lambda: kb_results.pop(0))
+    monkeypatch.setattr(main, "get_knowledge_base", gated("knowledge_base", tools.get_knowledge_base))
+    yield gates, kb_results
+    for gate in gates.values():
+        gate.set()
+
+
+def test_chat_returns_503_during_warm_up(stub_startup):
+    gates, kb_results = stub_startup
+    kb_results.append("kb")
+    with TestClient(app) as client:
+        response = client.post("/api/chat", json={"query": "show failed logins", "user_id": "security_admin"})
+        assert response.status_code == 503
+        assert response.json()["startup"]["subsystems"]["agent"]["status"] == "pending"
+
+        gates["agent"].set()
+        wait_until(lambda: app.state.startup.is_ready("agent"))
+        response = client.post("/api/chat", json={"query": "show failed logins", "user_id": "security_admin"})
+        assert response.status_code == 200
+        assert response.json()["response"] == "answer to show failed logins"
+        gates["log_stats"].set()
+        gates["knowledge_base"].set()
+
+
+def test_readiness_follows_serving_set(stub_startup):
+    """503 until agent and log stats are up, then 200 (degraded) without the KB."""
+    gates, kb_results = stub_startup
+    kb_results.extend([None, "kb"])
+    with TestClient(app) as client:
+        response = client.get("/health/ready")
+        assert response.status_code == 503
+        assert response.json()["mode"] == "starting"
+
+        gates["agent"].set()
+        wait_until(lambda: app.state.startup.is_ready("agent"))
+        assert client.get("/health/ready").status_code == 503
+
+        gates["log_stats"].set()
+        gates["knowledge_base"].set()  # the startup KB build fails
+        wait_until(lambda: app.state.startup.report()["subsystems"]["knowledge_base"]["status"] == "failed")
+        wait_until(lambda: app.state.startup.is_ready("log_stats"))
+        response = client.get("/health/ready")
+        assert response.status_code == 200
+        assert response.json()["mode"] == "degraded"
+        # probing does not build or mark anything
+        assert client.get("/health/ready").json()["subsystems"]["knowledge_base"]["status"] == "failed"
+
+        # lazy rebuild on first use marks the KB ready
+        assert tools.get_knowledge_base() == "kb"
+        wait_until(lambda: app.state.startup.fully_ready)
+        response = client.get("/health/ready")
+        assert response.status_code == 200
+        assert response.json()["mode"] == "ready"
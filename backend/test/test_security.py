@@ -0,0 +1,107 @@
+import json
+import os
+
+import pytest
+from app import security
+from app.security import (is_authorized, get_user_roles, get_log_scope, get_access_key,
+                          get_document_roles, can_read_document, clear_auth_cache)
+from app.metrics import get_counter
+
+
+@pytest.fixture(autouse=True)
+def rbac_policy(tmp_path, monkeypatch):
+    """Points the RBAC module at a temporary policy file."""
+    policy = {
+        "default_role": "employee",
+        "roles": {
+            "security_admin": ["policy_search", "log_access"],
+            "employee": ["policy_search", "log_access_own"],
+            "contractor": [],
+        },
+        "users": {"admin": ["security_admin"], "bob": ["contractor"]},
+        "documents": {"public.md": ["*"], "secret.md": ["security_admin"]},
+        "default_document_roles": ["security_admin"],
+    }
+    path = tmp_path / "policy.json"
+    path.write_text(json.dumps(policy))
+    monkeypatch.setattr(security, "RBAC_POLICY_PATH", str(path))
+    clear_auth_cache()
+    yield path
+    clear_auth_cache()
+
+
+def test_roles_from_policy_file():
+    """Known users get their roles, others the default role."""
+    assert get_user_roles("admin") == frozenset(["security_admin"])
+    assert get_user_roles("someone") == frozenset(["employee"])
+
+
+def test_is_authorized():
+    """Permissions are granted through roles."""
+    assert is_authorized("admin", "log_access")
+    assert not is_authorized("someone", "log_access")
+    assert is_authorized("someone", "policy_search")
+    assert not is_authorized("bob", "policy_search")
+
+
+def test_log_scope():
+    """Log scope is all, own rows, or nothing."""
+    assert get_log_scope("admin") == "all"
+    assert get_log_scope("someone") == "own"
+    assert get_log_scope("bob") is None
+
+
+def test_access_key_separates_own_scope_users():
+    """Users limited to their own rows never share an access key."""
+    assert get_access_key("alice") != get_access_key("carol")
+    assert get_access_key("admin") == get_access_key("admin")
+
+
+def test_document_acl():
+    """Document ACLs come from the policy file, '*' means everyone."""
+    assert can_read_document(frozenset(["employee"]), get_document_roles("/x/public.md"))
+    assert not can_read_document(frozenset(["employee"]), get_document_roles("/x/secret.md"))
+    assert can_read_document(frozenset(["security_admin"]), get_document_roles("/x/unknown.md"))
+
+
+def test_decisions_are_cached(rbac_policy):
+    """Repeated checks are served from the cache."""
+    before = get_counter("auth.cache_hits")
+    assert is_authorized("someone", "policy_search")
+    assert is_authorized("someone", "policy_search")
+    assert get_counter("auth.cache_hits") == before + 1
+
+
+def test_policy_change_revokes_cached_decisions(rbac_policy):
+    """A changed policy file applies at once, not after the cache TTL."""
+    assert is_authorized("someone", "policy_search")
+    assert get_user_roles("admin") == frozenset(["security_admin"])
+    rbac_policy.write_text(json.dumps({"default_role": "employee", "roles": {"employee": []}}))
+    os.utime(rbac_policy, ns=(0, 0))  # make sure the reload sees a new mtime
+
+    assert not is_authorized("someone", "policy_search")
+    assert get_user_roles("admin") == frozenset(["employee"])
+
+
+def test_missing_policy_on_first_load_is_logged(tmp_path, monkeypatch, caplog):
+    """Without a policy file everyone is denied, and that is logged."""
+    monkeypatch.setattr(security, "RBAC_POLICY_PATH", str(tmp_path / "missing.json"))
+    monkeypatch.setattr(security, "_policy", {})
+    monkeypatch.setattr(security, "_policy_mtime", None)
+    monkeypatch.setattr(security, "_policy_missing", False)
+
+    with caplog.at_level("ERROR"):
+        assert not is_authorized("admin", "log_access")
+        assert not is_authorized("admin", "policy_search")
+    assert len([r for r in caplog.records if "not found" in r.getMessage()]) == 1
+
+
+def test_malformed_policy_keeps_last_good(rbac_policy):
+    """A half-written policy file is ignored until it parses again."""
+    assert is_authorized("admin", "log_access")
+    rbac_policy.write_text('{"roles": {')
+    os.utime(rbac_policy, ns=(1, 1))
+    clear_auth_cache()
+
+    assert is_authorized("admin", "log_access")
+    assert get_log_scope("someone") == "own"
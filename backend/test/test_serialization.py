@@ -0,0 +1,95 @@
+import gzip
+from typing import List
+
+import msgspec
+import pytest
+from app import serialization
+from app.serialization import choose_encoding, compress, json_response
+from app.security import AuditRecord, log_audit_event, get_audit_log_json
+from app.metrics import get_counter
+
+
+def test_choose_encoding(monkeypatch):
+    """gzip is negotiated from Accept-Encoding, q=0 is a refusal."""
+    monkeypatch.setattr(serialization, "zstandard", None)
+    assert choose_encoding(None) is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip, deflate, br") == "gzip"
+    assert choose_encoding("gzip;q=0, br") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("gzip;q=0, *") is None
+    assert choose_encoding("gzip;q=0.0") is None
+    assert choose_encoding("GZIP;Q=0.5") == "gzip"
+
+
+def test_choose_encoding_prefers_zstd(monkeypatch):
+    """zstd wins over gzip when it is installed."""
+    monkeypatch.setattr(serialization, "zstandard", object())
+    assert choose_encoding("gzip, zstd") == "zstd"
+    assert choose_encoding("zstd;q=0.1, gzip;q=1") == "gzip"
+    assert choose_encoding("zstd;q=0.5, gzip;q=0.5") == "zstd"
+    assert choose_encoding("zstd;q=0, *") == "gzip"
+    monkeypatch.setattr(serialization, "zstandard", None)
+    assert choose_encoding("gzip, zstd") == "gzip"
+
+
+def test_gzip_round_trip():
+    body = b'{"response": "ok"}' * 100
+    assert gzip.decompress(compress(body, "gzip")) == body
+    assert compress(body, None) is body
+
+
+def test_small_responses_are_not_compressed():
+    """Bodies under COMPRESSION_MIN_BYTES go out as is."""
+    response = json_response("gzip", {"response": "hi"}, "test_small")
+    assert "content-encoding" not in response.headers
+    assert response.body == b'{"response":"hi"}'
+
+
+def test_large_responses_are_compressed():
+    """Large bodies are compressed with the negotiated encoding."""
+    payload = {"response": "x" * (serialization.COMPRESSION_MIN_BYTES * 2)}
+    response = json_response("gzip", payload, "test_large")
+    assert response.headers["content-encoding"] == "gzip"
+    assert msgspec.json.decode(gzip.decompress(response.body)) == payload
+
+
+def test_audit_log_json_matches_schema():
+    """The pre-encoded audit store decodes back into AuditRecord structs."""
+    audit_id = log_audit_event("tester", "show failed logins", "QueryReceived", {"System": "test"}, "Received")
+
+    records = msgspec.json.decode(get_audit_log_json(), type=List[AuditRecord])
+    record = next(r for r in records if r.audit_id == audit_id)
+    assert record.user_id == "tester"
+    assert record.details == {"System": "test"}
+
+
+def test_audit_entries_are_validated():
+    """Entries that do not match the schema are rejected before they are stored."""
+    before = len(get_audit_log_json())
+
+    with pytest.raises(msgspec.ValidationError):
+        log_audit_event(123, "q", "QueryReceived", {"System": "test"}, "Received")
+    with pytest.raises(msgspec.ValidationError):
+        log_audit_event("tester", "q", "QueryReceived", "not a dict", "Received")
+    with pytest.raises(msgspec.ValidationError):
+        log_audit_event("tester", "q", "QueryReceived", {"System": object()}, "Received")
+
+    assert len(get_audit_log_json()) == before
+
+
+def test_audit_entry_encode_time_is_recorded():
+    before = get_counter("serialize.audit_entry.count")
+    log_audit_event("tester", "q", "QueryReceived", {"System": "test"}, "Received")
+    assert get_counter("serialize.audit_entry.count") == before + 1
+
+
+def test_serialize_time_covers_callable_content():
+    """Callables are run inside the timer, plain bytes are not counted as serialization."""
+    before = get_counter("serialize.test_bytes.count")
+    json_response(None, b'{"ok":true}', "test_bytes")
+    assert get_counter("serialize.test_bytes.count") == before
+
+    response = json_response(None, get_audit_log_json, "test_callable")
+    assert get_counter("serialize.test_callable.count") == 1
+    assert response.body.startswith(b"[")
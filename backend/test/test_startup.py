@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from app.metrics import get_metrics, reset_metrics
+from app.startup import StartupState, build_in_background
+
+
+def test_staged_startup_modes():
+    """starting -> degraded -> ready, with startup timings recorded."""
+
+    async def main():
+        state = StartupState(["log_stats", "agent"])
+        state.mark_live()
+        assert state.mode() == "starting"
+
+        await build_in_background(state, "log_stats", lambda: "stats")
+        assert state.mode() == "degraded"
+        assert not state.fully_ready
+
+        agents = []
+        await build_in_background(state, "agent", lambda: "agent", on_ready=agents.append)
+        assert agents == ["agent"]
+        return state
+
+    state = asyncio.run(main())
+    assert state.mode() == "ready"
+    gauges = get_metrics()["gauges"]
+    assert "startup.time_to_first_healthy_seconds" in gauges
+    assert "startup.time_to_fully_ready_seconds" in gauges
+
+
+def test_failed_subsystem_fails_fast():
+    """Waiters return as soon as a subsystem fails, instead of waiting out the timeout."""
+
+    async def main():
+        state = StartupState(["knowledge_base"])
+
+        def broken():
+            raise ConnectionError("ollama unreachable")
+
+        build = asyncio.create_task(build_in_background(state, "knowledge_base", broken))
+        start = time.monotonic()
+        ready = await state.wait_for("knowledge_base", timeout=5)
+        await build
+        return state, ready, time.monotonic() - start
+
+    state, ready, waited = asyncio.run(main())
+    assert not ready
+    assert waited < 1
+    assert state.report()["subsystems"]["knowledge_base"]["status"] == "failed"
+
+
+def test_builder_returning_none_is_failed():
+    """get_knowledge_base returns None on error; that counts as failed."""
+
+    async def main():
+        state = StartupState(["knowledge_base"])
+        await build_in_background(state, "knowledge_base", lambda: None)
+        return state
+
+    assert not asyncio.run(main()).is_ready("knowledge_base")
+
+
+def test_wait_for_times_out():
+    async def main():
+        state = StartupState(["agent"])
+        return await state.wait_for("agent", timeout=0.05)
+
+    assert asyncio.run(main()) is False
+
+
+def test_first_healthy_is_when_the_serving_set_is_up():
+    """Time to first healthy is recorded when readiness would first return 200, not at mark_live."""
+    reset_metrics()
+    state = StartupState(["log_stats", "knowledge_base", "agent"], required=["log_stats", "agent"])
+    state.mark_live()
+    state.mark_ready("log_stats")
+    assert "startup.time_to_first_healthy_seconds" not in get_metrics()["gauges"]
+
+    state.mark_ready("agent")
+    assert state.serving and not state.fully_ready
+    assert "startup.time_to_first_healthy_seconds" in get_metrics()["gauges"]
+
+
+def test_required_builds_are_retried():
+    """A failed required build is retried with backoff instead of staying failed."""
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise ConnectionError("ollama unreachable")
+        return "agent"
+
+    async def main():
+        state = StartupState(["agent"])
+        await build_in_background(state, "agent", flaky, retry_seconds=0.01, max_retry_seconds=0.02)
+        return state
+
+    assert asyncio.run(main()).is_ready("agent")
+    assert len(attempts) == 3
@@ -1,6 +1,8 @@
 import pytest
 import os
-from app.tools import security_policy_search, query_security_logs, get_knowledge_base
+import json
+from app.security import CURRENT_USER
+from app.tools import security_policy_search, query_security_logs, security_log_stats, get_knowledge_base
 
 # Mark all tests in this file as async using pytest-asyncio
 pytestmark = pytest.mark.asyncio
@@ -12,6 +14,15 @@ def initialize_kb():
     get_knowledge_base()
 
 
+@pytest.fixture
+def as_user():
+    """Sets the request user the tools read their identity from."""
+    tokens = []
+    yield lambda user_id: tokens.append(CURRENT_USER.set(user_id))
+    for token in reversed(tokens):
+        CURRENT_USER.reset(token)
+
+
 # --- Policy Tool Tests (Using .invoke() and flexible checks) ---
 
 def test_security_policy_search_phishing():
@@ -45,8 +56,9 @@ def test_security_policy_search_no_results():
 
 # --- Log Tool Tests (Using .invoke()) ---
 
-def test_query_security_logs_failed_logins_today():
+def test_query_security_logs_failed_logins_today(as_user):
     """Test querying for failed logins on the mock date."""
+    as_user("security_admin")
     result = query_security_logs.invoke("show failed logins today")
     result_lower = result.lower()
 
@@ -58,8 +70,9 @@ def test_query_security_logs_failed_logins_today():
     assert "invalid password" in result_lower
     assert "2024-10-28" in result
 
-def test_query_security_logs_specific_user():
+def test_query_security_logs_specific_user(as_user):
     """Test querying logs for a specific user."""
+    as_user("security_admin")
     result = query_security_logs.invoke("activity for user alex.m")
     result_lower = result.lower()
 
@@ -68,10 +81,84 @@ def test_query_security_logs_specific_user():
     assert "file_access" in result_lower
     assert "203.0.113.12" in result
 
-def test_query_security_logs_no_results():
+def test_query_security_logs_no_results(as_user):
     """Test querying for logs that don't exist."""
+    as_user("security_admin")
     result = query_security_logs.invoke("show successful logins from 2023")
     result_lower = result.lower()
 
     assert isinstance(result, str)
     assert "no log entries found" in result_lower
+
+def test_query_security_logs_own_rows_only(as_user):
+    """Users without log_access only see their own rows."""
+    as_user("jane.d")
+    result = query_security_logs.invoke("show failed logins today")
+    result_lower = result.lower()
+
+    assert "found 2 log entries" in result_lower
+    assert "sam.k" not in result_lower
+
+def test_query_security_logs_anonymous_no_rows():
+    """Anonymous users have no rows of their own to see."""
+    result = query_security_logs.invoke("show failed logins today")
+    assert "no log entries found" in result.lower()
+
+def test_tool_input_cannot_claim_a_user():
+    """The identity comes from the request context, not from tool arguments."""
+    assert "user_id" not in query_security_logs.args
+    result = query_security_logs.invoke({"log_query": "show failed logins today", "user_id": "security_admin"})
+    assert "no log entries found" in result.lower()
+    result = security_log_stats.invoke({"question": "top offenders", "user_id": "security_admin"})
+    assert "access denied" in result.lower()
+
+def test_security_log_stats_failed_logins(as_user):
+    """Failed-login aggregates come from the precomputed stats."""
+    as_user("security_admin")
+    result = security_log_stats.invoke("which IPs had repeated failed logins today?")
+
+    assert "failed logins in the 24h window" in result.lower()
+    assert "jane.d: 2 failed logins from 1 distinct ips" in result.lower()
+    assert "198.51.100.45: 2 failed logins" in result
+
+def test_security_log_stats_for_one_user(as_user):
+    """Per-user questions are answered from the same aggregates."""
+    as_user("security_admin")
+    result = security_log_stats.invoke({"question": "failed logins of jane.d", "target_user_id": "jane.d"})
+    assert "jane.d: 2 failed logins from 1 distinct ips in the 24h window" in result.lower()
+
+def test_security_log_stats_denied():
+    """Log stats need full log access."""
+    result = security_log_stats.invoke("top offenders")
+    assert "access denied" in result.lower()
+
+def test_document_acl_follows_policy_changes(tmp_path, monkeypatch):
+    """Editing document ACLs in the policy file applies to an already built index."""
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app import security
+    from app.tools import filtered_similarity_search
+
+    def write_policy(secret_roles, mtime):
+        path.write_text(json.dumps({
+            "default_role": "employee",
+            "roles": {"employee": ["policy_search"]},
+            "documents": {"public.md": ["*"], "secret.md": secret_roles},
+        }))
+        os.utime(path, ns=(mtime, mtime))
+
+    path = tmp_path / "policy.json"
+    write_policy(["security_admin"], 1)
+    monkeypatch.setattr(security, "RBAC_POLICY_PATH", str(path))
+
+    docs = [Document(page_content=name, metadata={"source": f"/policies/{name}"}) for name in ["public.md", "secret.md"]]
+    for doc in docs:
+        doc.metadata["allowed_roles"] = security.get_document_roles(doc.metadata["source"])
+    db = FAISS.from_documents(docs, DeterministicFakeEmbedding(size=16))
+    employee = frozenset(["employee"])
+
+    assert [d.page_content for d in filtered_similarity_search(db, "policy", employee, k=2)] == ["public.md"]
+
+    write_policy(["*"], 2)
+    assert sorted(d.page_content for d in filtered_similarity_search(db, "policy", employee, k=2)) == ["public.md", "secret.md"]